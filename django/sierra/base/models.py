@@ -2109,9 +2109,9 @@ class ItemRecord(MainRecordTypeModel):
             bib_cn_tuples = []
 
         cn_string, cn_type = (None, None)
-        if len(item_cn_tuples) > 0:
+        if item_cn_tuples:
             (cn_string, cn_type) = item_cn_tuples[0]
-        elif len(bib_cn_tuples) > 0:
+        elif bib_cn_tuples:
             (cn_string, cn_type) = bib_cn_tuples[0]
 
         if self._cn_is_sudoc(cn_string, bib_cn_tuples):
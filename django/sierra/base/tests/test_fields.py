@@ -109,7 +109,7 @@ def testmodels(app_models_env):
     """
     testmodels = app_models_env.models
     for model in testmodels.values():
-        if hasattr(model, 'objects') and len(model.objects.all()):
+        if hasattr(model, 'objects') and model.objects.exists():
             model.objects.all().delete()
     return testmodels
 
@@ -336,7 +336,7 @@ def test_vcfield_pk_lookups_work(modelname, name, number, parent_int,
     tmodel = testmodels[modelname]
     test_inst = make_instance(modelname, name, number, parent_int, parent_str)
     noise = [make_instance(modelname, *f) for f in noise_data(5)]
-    assert len(tmodel.objects.all()) == 6
+    assert tmodel.objects.count() == 6
     assert tmodel.objects.get(pk=expected_pk) == test_inst
     assert tmodel.objects.filter(pk=expected_pk)[0] == test_inst
 
@@ -363,7 +363,7 @@ def test_vcfield_pk_uniqueness_works(modelname, name, number, parent_int,
     tmodel = testmodels[modelname]
     test_inst = make_instance(modelname, name, number, parent_int, parent_str)
     noise = [make_instance(modelname, *f) for f in noise_data(5)]
-    assert len(tmodel.objects.all()) == 6
+    assert tmodel.objects.count() == 6
     with pytest.raises(IntegrityError):
         make_instance(modelname, name, number, parent_int, parent_str)
 
@@ -395,7 +395,7 @@ def test_vcfield_uniqueness_fails(modelname, name, number, parent_int,
     test_inst = make_instance(modelname, name, number, parent_int, parent_str)
     noise = [make_instance(modelname, *f) for f in noise_data(5)]
     dupe = make_instance(modelname, name, number, parent_int, parent_str)
-    assert len(tmodel.objects.all()) == 7
+    assert tmodel.objects.count() == 7
     assert test_inst and dupe and (test_inst.pk == dupe.pk)
 
 
@@ -414,7 +414,7 @@ def test_vcfield_nonpk_not_unique(modelname, name, number, parent_int,
     test_inst = make_instance(modelname, name, number, parent_int, parent_str)
     noise = [make_instance(modelname, *f) for f in noise_data(5)]
     dupe = make_instance(modelname, name, number, parent_int, parent_str)
-    assert len(tmodel.objects.all()) == 7
+    assert tmodel.objects.count() == 7
     assert test_inst and dupe and (test_inst.vcf == dupe.vcf)
 
 
@@ -467,7 +467,7 @@ def test_vcfield_exact_lookups_work(modelname, name, number, parent_int,
     vcf_cols = [pf.column for pf in tmodel._meta.get_field('vcf').partfields]
     partfield_pattern = r'\W.* AND .*\W'.join(vcf_cols)
     where_pattern = r'\W{}\W'.format(partfield_pattern)
-    assert len(tmodel.objects.all()) == 6
+    assert tmodel.objects.count() == 6
     assert tmodel.objects.get(vcf=lookup_arg) == test_inst
     assert len(qset) == 1 and test_inst in qset
     assert test_inst not in exclude_qset
@@ -573,7 +573,7 @@ def test_vcfield_other_lookups_work(modelname, name, number, parent_int,
     vcf_cols = [pf.column for pf in tmodel._meta.get_field('vcf').partfields]
     partfield_pattern = r'\W.*\W'.join(vcf_cols)
     where_pattern = r'^CONCAT\(.*\W{}\W'.format(partfield_pattern)
-    assert len(tmodel.objects.all()) == 6
+    assert tmodel.objects.count() == 6
     assert test_inst in [r for r in qset]
     assert test_inst not in [r for r in exclude_qset]
     assert re.search(where_pattern, where)
@@ -570,10 +570,13 @@ def get_records_from_index(solr_conns, solr_search):
             conn = solr_conns[getattr(index, 'using', 'default')]
             results = solr_search(conn, '*')
 
+        results_by_id = {}
+        for result in results:
+            results_by_id.setdefault(result[id_fname], []).append(result)
+
         found_records = {}
         for record in record_set:
-            cmp_id = index.get_qualified_id(record)
-            matches = [r for r in results if r[id_fname] == cmp_id]
+            matches = results_by_id.get(index.get_qualified_id(record), [])
             if len(matches) == 1:
                 found_records[record.pk] = matches[0]
         return found_records
@@ -589,13 +592,15 @@ def assert_records_are_indexed(get_records_from_index):
     """
     def _assert_records_are_indexed(index, record_set, results=None):
         results = get_records_from_index(index, record_set, results)
+        checked_fields = set()
         for record in record_set:
             assert record.pk in results
             result = results[record.pk]
-            for field in result.keys():
+            for field in set(result.keys()) - checked_fields:
                 schema_field = index.get_schema_field(field)
                 assert schema_field is not None
                 assert schema_field['stored']
+                checked_fields.add(field)
     return _assert_records_are_indexed
 
 
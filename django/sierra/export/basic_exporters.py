@@ -356,6 +356,7 @@ class BibsDownloadMarc(Exporter):
     parallel = False
     model = sierra_models.BibRecord
     prefetch_related = [
+        'record_metadata__controlfield_set',
         'record_metadata__varfield_set',
         'bibrecorditemrecordlink_set',
         'bibrecorditemrecordlink_set__item_record',
@@ -409,6 +410,7 @@ class BibsToSolr(ToSolrExporter):
     ]
     max_rec_chunk = 2000
     prefetch_related = [
+        'record_metadata__controlfield_set',
         'record_metadata__varfield_set',
         'bibrecorditemrecordlink_set',
         'bibrecorditemrecordlink_set__item_record',
@@ -13,7 +13,10 @@ import logging
 import sys
 import traceback
 from collections import OrderedDict, namedtuple
+from functools import partial
+from multiprocessing.pool import ThreadPool
 
+from django.db import connections
 from django.db.models import F
 from django.utils import timezone as tz
 from django.conf import settings
@@ -28,6 +31,20 @@ class ExportError(Exception):
     pass
 
 
+def _run_child_op(job):
+    """
+    Run one (operation, records) job for `do_op_on_children` in a pool
+    thread. Django opens a separate DB connection in each thread, so
+    those are closed when the job finishes.
+    """
+    op, records = job
+    try:
+        return op(records)
+    finally:
+        for conn in connections.all():
+            conn.close()
+
+
 class Exporter(object):
     """
     Exporter class. Subclass this to define your export jobs. Your
@@ -107,7 +124,7 @@ class Exporter(object):
     app_name = 'export'
 
     def __init__(self, instance_pk, export_filter, export_type, options=None,
-                 log_label=''):
+                 log_label='', instance=None):
         """
         Arguments: instance_pk is the pk for the export_instance
         attached to the export job; export_filter is the export_filter
@@ -115,32 +132,37 @@ class Exporter(object):
         string for this job; options is an optional dictionary
         containing specs for export_filter (date range, record range,
         etc.) Log_label is the label used in log messages to show the
-        source of the message.
+        source of the message. Pass an already-loaded ExportInstance
+        object as `instance` to avoid fetching it again via
+        `instance_pk` (e.g., when a parent exporter spawns children).
         """
         max_rc_override = settings.EXPORTER_MAX_RC_CONFIG.get(export_type, 0)
         max_dc_override = settings.EXPORTER_MAX_DC_CONFIG.get(export_type, 0)
         self.max_rec_chunk = max_rc_override or type(self).max_rec_chunk
         self.max_del_chunk = max_dc_override or type(self).max_del_chunk
-        self.instance = ExportInstance.objects.get(pk=instance_pk)
+        if instance is None:
+            instance = ExportInstance.objects.get(pk=instance_pk)
+        self.instance = instance
         self.status = 'unknown'
+        self._pending_warnings = 0
+        self._pending_errors = 0
         self.export_filter = export_filter
         self.export_type = export_type
         self.options = options or {}
         self.log_label = log_label if log_label else self.__class__.__name__
         if export_filter == 'last_export':
-            try:
-                latest = ExportInstance.objects.filter(
-                    export_type=self.export_type, 
-                    status__in=['success', 'done_with_errors']
-                ).order_by(
-                    '-timestamp'
-                )[0]
-            except IndexError:
+            latest_time = ExportInstance.objects.filter(
+                export_type=self.export_type,
+                status__in=['success', 'done_with_errors']
+            ).order_by(
+                '-timestamp'
+            ).values_list('timestamp', flat=True).first()
+            if latest_time is None:
                 raise ExportError('This export type has never been run '
                                   'successfully before or does not exist. '
                                   'There is no last-updated date to use for '
                                   'this job.')
-            self.options['latest_time'] = latest.timestamp
+            self.options['latest_time'] = latest_time
         # set up our loggers for this process
         self.logger = logging.getLogger('exporter.file')
         self.console_logger = logging.getLogger('sierra.custom')
@@ -170,18 +192,20 @@ class Exporter(object):
                               prefetch_related=None):
         """
         Utility method for fetching a filtered queryset based on the
-        provided args and kwargs.
+        provided args and kwargs. `select_related` and
+        `prefetch_related` are only applied if non-empty, since each
+        call clones the queryset.
         """
-        prefetch_related = prefetch_related or []
         qs = model.objects.filter_by(export_filter, options=filter_options)
         
         if added_filters:
             q_filter = helpers.reduce_filter_kwargs(added_filters)
             qs = qs.filter(q_filter)
 
-        if select_related and select_related is not None:
+        if select_related:
             qs = qs.select_related(*select_related)
-        qs = qs.prefetch_related(*prefetch_related)
+        if prefetch_related:
+            qs = qs.prefetch_related(*prefetch_related)
         return qs
 
     def log(self, type, message, label=''):
@@ -193,35 +217,64 @@ class Exporter(object):
         label = label if label else self.log_label
         message = '[{}] {}'.format(label, message)
         getattr(self.logger, type.lower())(message)
-        if type.lower() == 'warning' or type.lower() == 'error':
-            if type.lower() == 'warning':
-                self.instance.warnings = F('warnings') + 1
-            else:
-                self.instance.errors = F('errors') + 1
-            self.instance.save()
+        if type.lower() == 'warning':
+            self._pending_warnings += 1
+        elif type.lower() == 'error':
+            self._pending_errors += 1
+
+    def _pop_log_counter_updates(self):
+        """
+        Return a dict of F-expression updates that add the pending
+        warning and error counts to the ExportInstance, and reset the
+        pending counts. The dict is empty if nothing is pending.
+        """
+        counts = {}
+        if self._pending_warnings:
+            counts['warnings'] = F('warnings') + self._pending_warnings
+        if self._pending_errors:
+            counts['errors'] = F('errors') + self._pending_errors
+        self._pending_warnings = 0
+        self._pending_errors = 0
+        return counts
+
+    def flush_log_counters(self):
+        """
+        Adds the warning and error counts accumulated via `log` to the
+        ExportInstance in the database, using one UPDATE, and then
+        resets them. `save_status` calls this; call it yourself if your
+        job needs the counts saved at any other point.
+        """
+        counts = self._pop_log_counter_updates()
+        if counts:
+            ExportInstance.objects.filter(pk=self.instance.pk).update(**counts)
 
     def log_error(self, e_msg):
         """
         Helper for logging errors, including logging a traceback out to
         the console, if applicable.
         """
-        ex_type, ex, tb = sys.exc_info()
-        self.console_logger.info(traceback.extract_tb(tb))
+        if self.console_logger.isEnabledFor(logging.INFO):
+            ex_type, ex, tb = sys.exc_info()
+            self.console_logger.info(''.join(traceback.format_tb(tb)))
         self.log('Error', e_msg, self.log_label)
 
     def save_status(self):
         """
-        Saves self.status to the database.
+        Saves self.status to the database, along with any pending
+        warning/error counts.
         """
-        try:
-            status = Status.objects.get(pk=self.status)
-        except Status.DoesNotExist:
+        status_id = self.status
+        if not Status.objects.filter(pk=status_id).exists():
             message = 'Could not set export instance status to "{}": status '\
                       'not defined in database.'.format(self.status)
             self.log('Warning', message)
-            status = Status.objects.get(pk='unknown')
-        self.instance.status = status
-        self.instance.save()
+            status_id = 'unknown'
+        updates = self._pop_log_counter_updates()
+        updates['status_id'] = status_id
+        ExportInstance.objects.filter(pk=self.instance.pk).update(**updates)
+        self.instance.status_id = status_id
+        # Compound exporters also flush counts for their children here.
+        self.flush_log_counters()
 
     def get_records(self, prefetch=True):
         """
@@ -351,14 +404,17 @@ class ToSolrExporter(Exporter):
     access to an `indexes` property. This is an OrderedDict allowing
     you to reference instantiated index objects by name.
 
-    Note that the Index class monkey-patches a couple of methods onto
-    the Haystack SearchIndex class when it spawns a new instance:
-    `do_update` defines how an index update is done (e.g. if called
-    from the exporter `export_records` method), and `do_delete` defines
-    how to delete a record from the index (e.g. if called from the
-    exporter `delete_records` method). You can customize these--or add
-    your own--by subclassing the Index class in your subclass and then
-    using your subclasses Index class in `index_config`.
+    Note that each Index object's `spawn_instance` method creates a
+    plain instance of the Haystack SearchIndex class it wraps and then
+    sets a few attributes on that instance: `_config`, the Index object
+    itself; `do_update`, which defines how an index update is done
+    (e.g. if called from the exporter `export_records` method); and
+    `do_delete`, which defines how to delete a record from the index
+    (e.g. if called from the exporter `delete_records` method). The
+    latter two are the Index object's own methods, bound to the new
+    SearchIndex instance. You can customize these--or add your own--by
+    subclassing the Index class in your subclass and then using your
+    subclasses Index class in `index_config`.
 
     Instance methods on ToSolrExporter are defined for basic export,
     delete, and commit operations. Essentially, each of these loops
@@ -374,22 +430,19 @@ class ToSolrExporter(Exporter):
         def do_delete(self, instance, records):
             instance.delete(commit=False, queryset=records)
 
-        def spawn_instance(self, parent_name):
-            nclassname = str('{}->{}'.format(parent_name, self.name))
-            nclass_attrs = {
-                '_config': self,
-                'do_update': lambda s, recs: s._config.do_update(s, recs),
-                'do_delete': lambda s, recs: s._config.do_delete(s, recs)
-            }
-            new_class = type(nclassname, (self.indexclass,), nclass_attrs)
-            return new_class(using=self.conn)
+        def spawn_instance(self):
+            instance = self.indexclass(using=self.conn)
+            instance._config = self
+            instance.do_update = partial(self.do_update, instance)
+            instance.do_delete = partial(self.do_delete, instance)
+            return instance
 
     index_config = tuple()
 
     @classmethod
-    def spawn_indexes(cls, parent_name='Exporter'):
+    def spawn_indexes(cls):
         return OrderedDict(
-            (i.name, i.spawn_instance(parent_name)) for i in cls.index_config
+            (i.name, i.spawn_instance()) for i in cls.index_config
         )
 
     @property
@@ -397,7 +450,7 @@ class ToSolrExporter(Exporter):
         try:
             self._indexes = self._indexes
         except AttributeError:
-            self._indexes = type(self).spawn_indexes(self.export_type)
+            self._indexes = type(self).spawn_indexes()
         return self._indexes
 
     def handle_error(self, obj_str, error):
@@ -469,6 +522,12 @@ class CompoundMixin(object):
     By default, the Child config object can be accessed via a `_config`
     attribute. Subclasses may patch their own attributes (via the
     `Child.get_patched_class_attrs` method).
+
+    Set `parallel_children` to True to have `do_op_on_children` run
+    each child's operation in its own thread when each child gets its
+    own recordset. Only do this if the children are independent and
+    each does enough I/O-bound work to outweigh the cost of a thread
+    and a separate database connection per child.
     """
 
     class Child(object):
@@ -477,6 +536,7 @@ class CompoundMixin(object):
             self.name = name
             self.export_type_code = export_type_code or name
             self._expclass = expclass
+            self._spawned_classes = {}
 
         @property
         def expclass(self):
@@ -485,8 +545,13 @@ class CompoundMixin(object):
                 self._expclass = export_type.get_exporter_class()
             return self._expclass
 
-        def derive_rel_list(self, exporter, which_rel):
-            return getattr(exporter, which_rel, [])
+        def derive_rel_list(self, exporter_or_class, which_rel):
+            """
+            Return the `which_rel` list (e.g. `select_related`) from
+            the given child exporter instance or class. When reading
+            from a class, the list must be a plain class attribute.
+            """
+            return getattr(exporter_or_class, which_rel, None) or []
 
         def get_patched_class_attrs(self):
             """
@@ -495,43 +560,69 @@ class CompoundMixin(object):
             """
             return {'_config': self}
 
+        def get_patched_class(self, parent_cls):
+            """
+            Return the patched exporter class to use for this child
+            under `parent_cls`. Classes are built once per parent class
+            and then reused.
+            """
+            try:
+                return self._spawned_classes[parent_cls]
+            except KeyError:
+                new_cls_name = str('{}->{}'.format(parent_cls.__name__,
+                                                   self.name))
+                new_cls_attrs = self.get_patched_class_attrs()
+                new_expclass = type(new_cls_name, (self.expclass,),
+                                    new_cls_attrs)
+                self._spawned_classes[parent_cls] = new_expclass
+                return new_expclass
+
         def spawn_instance(self, parent_cls, parent_instance_pk,
                            parent_export_filter, parent_export_type,
-                           parent_options):
-            new_cls_name = str('{}->{}'.format(parent_cls.__name__, self.name))
-            new_cls_attrs = self.get_patched_class_attrs()
-            new_expclass = type(new_cls_name, (self.expclass,), new_cls_attrs)
+                           parent_options, parent_instance=None):
+            new_expclass = self.get_patched_class(parent_cls)
             return new_expclass(parent_instance_pk, parent_export_filter,
                                 parent_export_type,
-                                options=parent_options.copy())
+                                options=parent_options.copy(),
+                                instance=parent_instance)
 
     children_config = tuple()
+    parallel_children = False
+    _children = None
 
     @classmethod
-    def spawn_children(cls, parent_args):
+    def spawn_children(cls, parent_args, parent_instance=None):
         return OrderedDict(
-            (c.name, c.spawn_instance(cls, *parent_args))
+            (c.name, c.spawn_instance(cls, *parent_args,
+                                      parent_instance=parent_instance))
                 for c in cls.children_config
         )
 
     @property
     def children(self):
-        try:
-            self._children = self._children
-        except AttributeError:
+        if self._children is None:
             args = (self.instance.pk, self.export_filter, self.export_type,
                     self.options)
-            self._children = type(self).spawn_children(args)
+            self._children = type(self).spawn_children(args, self.instance)
         return self._children
 
+    def flush_log_counters(self):
+        """
+        Flushes pending warning/error counts for this exporter and for
+        any children that have been spawned. Children share this
+        exporter's ExportInstance but keep their own pending counts.
+        """
+        super(CompoundMixin, self).flush_log_counters()
+        for child in (self._children or {}).values():
+            child.flush_log_counters()
+
     @staticmethod
     def combine_lists(*lists):
         """
         This is a helper method for combining and deduplicating entries
         from multiple lists, returning one sorted, flattened list.
         """
-        combined_dupes = sorted([item for l in lists for item in l])
-        return OrderedDict.fromkeys(combined_dupes).keys()
+        return sorted(set(item for l in lists for item in l))
 
     def combine_rels_from_children(self, which_rel, which_children=None):
         """
@@ -539,8 +630,24 @@ class CompoundMixin(object):
         select_related or prefetch_related) from 1+ children.
         """
         children = which_children or self.children.values()
-        rel_lists = [c._config.derive_rel_list(c, which_rel) for c in children]
-        return self.combine_lists(*rel_lists)
+        return self.combine_lists(
+            r for c in children
+                for r in c._config.derive_rel_list(c, which_rel)
+        )
+
+    @classmethod
+    def combine_rels_from_children_config(cls, which_rel, which_config=None):
+        """
+        Like `combine_rels_from_children`, but reads the relation lists
+        from each child's exporter class, via the Child config objects
+        in `children_config`, so that no children have to be spawned.
+        """
+        configs = which_config or cls.children_config
+        return cls.combine_lists(
+            r for c in configs
+                for r in c.derive_rel_list(c.get_patched_class(cls),
+                                           which_rel)
+        )
 
     def get_records_from_children(self, deletions=False, prefetch=True,
                                   which_children=None):
@@ -565,16 +672,32 @@ class CompoundMixin(object):
         `get_records_from_children` method), then the appropriate
         record set is sent to the appropriate child exporter;
         otherwise, `records` is sent to each child.
+
+        If `parallel_children` is True and `records` is a dict, the
+        children run concurrently in a thread pool. (A single shared
+        queryset is never evaluated from multiple threads.)
         """
-        vals = {}
+        records_by_child = isinstance(records, dict)
+        names, jobs = [], []
         for child in which_children or self.children.values():
-            op = getattr(child, operation)
-            if isinstance(records, dict):
-                child_rset = records.get(child._config.name, [])
+            name = child._config.name
+            if records_by_child:
+                child_rset = records.get(name, [])
             else:
                 child_rset = records
-            vals[child._config.name] = op(child_rset)
-        return vals
+            names.append(name)
+            jobs.append((getattr(child, operation), child_rset))
+
+        if self.parallel_children and records_by_child and len(jobs) > 1:
+            pool = ThreadPool(len(jobs))
+            try:
+                results = pool.map(_run_child_op, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [op(child_rset) for op, child_rset in jobs]
+        return dict(zip(names, results))
 
     def compile_vals_from_children(self, results):
         """
@@ -585,10 +708,11 @@ class CompoundMixin(object):
         item.
         """
         vals = {}
+        children = self.children
         for result in results:
             for name, rvals in (result or {}).items():
                 cvals = vals.get(name, None)
-                vals[name] = self.children[name].compile_vals([cvals, rvals])
+                vals[name] = children[name].compile_vals([cvals, rvals])
         return vals
 
     def do_final_callback_on_children(self, vals, status, which_children=None):
@@ -677,8 +801,8 @@ class AttachedRecordExporter(CompoundMixin, Exporter):
         def derive_records_from_parent(self, parent_record):
             return [parent_record]
 
-        def derive_rel_list(self, exporter, which_rel):
-            base_list = getattr(exporter, which_rel, [])
+        def derive_rel_list(self, exporter_or_class, which_rel):
+            base_list = getattr(exporter_or_class, which_rel, None) or []
             if self.rel_prefix:
                 return ['{}__{}'.format(self.rel_prefix, r) for r in base_list]
             return base_list
@@ -693,6 +817,55 @@ class AttachedRecordExporter(CompoundMixin, Exporter):
     def attached_children(self):
         return [c[1] for c in self.children.items()[1:]]
 
+    @classmethod
+    def required_prefetches_for_children(cls):
+        """
+        Return the `rel_prefix` values that must be added on their own
+        to `prefetch_related`. Each attached child's
+        `derive_records_from_parent` walks its `rel_prefix` relation,
+        so that relation must be prefetched on the parent recordset to
+        avoid querying once per parent record. A prefixed lookup such
+        as `prefix__field` already prefetches `prefix`, so only
+        attached children that have no relation lists of their own
+        need the bare prefix.
+        """
+        prefixes = []
+        for c in cls.children_config[1:]:
+            if not c.rel_prefix:
+                continue
+            child_cls = c.get_patched_class(cls)
+            if not (c.derive_rel_list(child_cls, 'select_related') or
+                    c.derive_rel_list(child_cls, 'prefetch_related')):
+                prefixes.append(c.rel_prefix)
+        return cls.combine_lists(prefixes)
+
+    @classmethod
+    def get_class_rels(cls):
+        """
+        Return a dict containing the `select_related` and
+        `prefetch_related` lists for this exporter class, derived from
+        the class attributes of each child's exporter class. These
+        don't depend on any instance, so they are calculated once and
+        cached on the class itself.
+
+        Because these are read from classes, children must define
+        `select_related`, `prefetch_related`, and `deletion_filter` as
+        class attributes, not properties.
+        """
+        if '_class_rels' not in cls.__dict__:
+            main_config = cls.children_config[0]
+            attached_config = cls.children_config[1:]
+            att_sr = cls.combine_rels_from_children_config('select_related',
+                                                           attached_config)
+            all_pr = cls.combine_rels_from_children_config('prefetch_related')
+            req_pr = cls.required_prefetches_for_children()
+            main_class = main_config.get_patched_class(cls)
+            cls._class_rels = {
+                'select_related': main_class.select_related,
+                'prefetch_related': cls.combine_lists(all_pr, att_sr, req_pr)
+            }
+        return cls._class_rels
+
     @property
     def select_related(self):
         """
@@ -701,23 +874,19 @@ class AttachedRecordExporter(CompoundMixin, Exporter):
         records are related via a base M2M relationship, so those
         automatically become part of prefetch_related.
         """
-        return self.main_child.select_related
+        return type(self).get_class_rels()['select_related']
 
     @property
     def prefetch_related(self):
         """
         With main and attached records, prefetch_related lists can be
         generated by combining the select_related lists for attached
-        children and prefetch_related lists for all children.
+        children and prefetch_related lists for all children. The
+        relations attached children are derived through are always
+        prefetched, either via those prefixed lookups or on their own
+        (see `required_prefetches_for_children`).
         """
-        try:
-            self._prefetch_related = self._prefetch_related
-        except AttributeError:
-            att_sr = self.combine_rels_from_children('select_related',
-                                                     self.attached_children)
-            all_pr = self.combine_rels_from_children('prefetch_related')
-            self._prefetch_related = self.combine_lists(all_pr, att_sr)
-        return self._prefetch_related
+        return type(self).get_class_rels()['prefetch_related']
 
     def derive_recordsets_from_parent(self, parent_recordset):
         """
@@ -726,17 +895,18 @@ class AttachedRecordExporter(CompoundMixin, Exporter):
         from attached children by passing each parent record to the
         `derive_records_from_parent` on each child's config class.
         """
-        rsets = {}
+        configs = [(name, child._config)
+                   for name, child in self.children.items()]
+        rsets = {name: set() for name, _ in configs}
         for record in parent_recordset:
-            for name, child in self.children.items():
-                rset = rsets.get(name, [])
-                rset.extend(child._config.derive_records_from_parent(record))
-                rsets[name] = rset
-        return {k: list(set(v)) for k, v in rsets.items()}
+            for name, config in configs:
+                rsets[name].update(config.derive_records_from_parent(record))
+        return {k: list(v) for k, v in rsets.items()}
 
     @property
     def deletion_filter(self):
-        return self.main_child.deletion_filter
+        main_config = type(self).children_config[0]
+        return main_config.get_patched_class(type(self)).deletion_filter
 
     def compile_vals(self, results):
         return self.compile_vals_from_children(results)
@@ -13,6 +13,27 @@ from django.conf import settings
 from utils import helpers
 
 
+# MARC tags 001-009 are control fields: data only, no indicators or
+# subfields.
+CONTROL_FIELD_TAGS = frozenset('{:03}'.format(num) for num in range(1, 10))
+
+# Matches a subfield delimiter plus its code, e.g. '|a'.
+SUBFIELD_SPLIT_RE = re.compile(r'\|([a-z0-9])')
+
+# Strips the quoted link text that sometimes follows the URL in 856$u.
+URL_LINK_TEXT_RE = re.compile(r'^([^ ]+) ".*$')
+
+
+def split_subfields(content):
+    """
+    Splits Sierra varfield `content` into the flat list of alternating
+    subfield codes and values that pymarc expects, e.g.:
+    '|aTitle|bRest' => ['a', 'Title', 'b', 'Rest']. Any content that
+    appears before the first subfield code is dropped.
+    """
+    return SUBFIELD_SPLIT_RE.split(content)[1:]
+
+
 class S2MarcError(Exception):
     def __init__(self, message, record_id):
         self.msg = message
@@ -70,31 +91,28 @@ class S2MarcBatch(object):
             varfields = r.record_metadata.varfield_set\
                         .exclude(marc_tag=None)\
                         .exclude(marc_tag='')\
-                        .order_by('marc_tag')
+                        .order_by('marc_tag')\
+                        .values_list('marc_tag', 'marc_ind1', 'marc_ind2',
+                                     'field_content')
         except Exception as e:
             raise S2MarcError('Skipped. Couldn\'t retrieve varfields. '
                     '({})'.format(e), str(r))
-        for vf in varfields:
-            tag = vf.marc_tag
-            ind1 = vf.marc_ind1
-            ind2 = vf.marc_ind2
-            content = vf.field_content
+        for tag, ind1, ind2, content in varfields:
             try:
-                if tag in ['{:03}'.format(num) for num in range(1,10)]:
+                if tag in CONTROL_FIELD_TAGS:
                     field = pymarc.field.Field(tag=tag, data=content)
                 else:
                     field = pymarc.field.Field(
                             tag=tag,
                             indicators=[ind1, ind2],
-                            subfields=re.split(r'\|([a-z0-9])', content)[1:]
+                            subfields=split_subfields(content)
                     )
                     if tag == '856' and field['u'] is not None:
-                        field['u'] = re.sub(r'^([^ ]+) ".*$', r'\1',
-                                            field['u'])
+                        field['u'] = URL_LINK_TEXT_RE.sub(r'\1', field['u'])
                 marc_record.add_ordered_field(field)
             except Exception as e:
                 raise S2MarcError('Skipped. Couldn\'t create MARC field '
-                        'for {}. ({})'.format(vf.marc_tag, e), str(r))
+                        'for {}. ({})'.format(tag, e), str(r))
                 break
         if not marc_record.fields:
             raise S2MarcError('Skipped. No MARC fields on Bib record.', str(r))
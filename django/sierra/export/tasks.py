@@ -46,6 +46,19 @@ def needs_database(job_func):
     return _wrapper
 
 
+def _flush_log_counters(exp):
+    """
+    Save the given exporter's pending warning/error counts. Call this
+    in a `finally` block: failures are logged rather than raised, so
+    they can't mask an exception raised by the task itself.
+    """
+    try:
+        exp.flush_log_counters()
+    except Exception as e:
+        exp_logger.error('Could not save warning/error counts for export '
+                         'instance {}: {}'.format(exp.instance.pk, e))
+
+
 def spawn_exporter(inst_pk, exp_filter, exp_type, opts):
     """
     Spawn an Exporter obj using the given parameters.
@@ -323,7 +336,10 @@ class ExportTask(Task):
         except Exception:
             exp_logger.error(msg)
         else:
-            exp.log('Error', msg)
+            try:
+                exp.log_error(msg)
+            finally:
+                _flush_log_counters(exp)
 
     def on_success(self, vals, task_id, args, kwargs):
         """
@@ -343,6 +359,8 @@ class ExportTask(Task):
         except Exception as e:
             msg = ('During `on_success` for chunk {}, `plan.finish_chunk` '
                    'failed with error: {}'.format(chunk_id, e))
+        finally:
+            _flush_log_counters(exp)
 
 
 # Private functions below are just reusable components for tasks
@@ -370,15 +388,19 @@ def _pack_pks_from_records(records):
     the queryset. In the latter, PKs from different querysets may
     overlap, so each PK is qualified using the key from the QS dict,
     and the PK becomes a tuple: (key, PK).
+
+    PKs are streamed from the DB cursor rather than cached on the
+    queryset, since a full job can include hundreds of thousands of
+    records.
     """
     pks = []
     for name, qset in _get_recordsets_iterable(records):
         if qset is not None:
-            pk_qset = _apply_pk_sort_order(qset)
+            pk_qset = _apply_pk_sort_order(qset).values_list('pk', flat=True)
             if name is None:
-                pks.extend([r['pk'] for r in pk_qset.values('pk')])
+                pks.extend(pk_qset.iterator())
             else:
-                pks.extend([(name, r['pk']) for r in pk_qset.values('pk')])
+                pks.extend((name, pk) for pk in pk_qset.iterator())
     return pks
 
 
@@ -451,106 +473,110 @@ def delegate_batch(vals_list, instance_pk, export_filter, export_type, options,
     `do_final_cleanup` is called.
     """
     exp = spawn_exporter(instance_pk, export_filter, export_type, options)
-    plan = JobPlan(exp)
-    vals_list = vals_list or []
+    try:
+        plan = JobPlan(exp)
+        vals_list = vals_list or []
 
-    if batch_num == 0:
-        exp.log('Info', 'Job received.')
-        exp.status = 'in_progress'
-        exp.save_status()
-        exp.log('Info', _hr_line())
-        exp.log('Info', 'EXPORTER {} -- {}'.format(exp.instance.pk,
-                                                   exp.export_type))
-        exp.log('Info', _hr_line())
-        exp.log('Info', 'Fetching PK lists.')
-        pk_lists = _fetch_job_pk_lists(exp, plan)
-        exp.log('Info', 'Initializing job plan.')
-        plan.generate(pk_lists)
-        if plan.registry:
+        if batch_num == 0:
+            exp.log('Info', 'Job received.')
+            exp.status = 'in_progress'
+            exp.save_status()
             exp.log('Info', _hr_line())
-            plan.log_plan_summary(exp)
+            exp.log('Info', 'EXPORTER {} -- {}'.format(exp.instance.pk,
+                                                       exp.export_type))
             exp.log('Info', _hr_line())
-        else:
-            msg = ('No records found for {}. Nothing to do!'
-                   ''.format(', '.join(pk_lists.keys())))
-            exp.log('Info', msg)
-
-    elif prev_batch_had_errors:
-        vals_list = _compile_vals_list_for_batch(prev_batch_task_id)
-        exp.log('Info', vals_list)
-
-    cumulative_vals = exp.compile_vals([cumulative_vals] + vals_list)
-
-    # UNCOMMENT the below to help troubleshoot issues with `vals`
-    # exp.log('Info', 'BATCH {}'.format(batch_num))
-    # exp.log('Info', 'vals_list: {}'.format(vals_list))
-    # exp.log('Info', 'cumulative_vals: {}'.format(cumulative_vals))
-
-    batch_id = plan.get_batch_id(batch_num)
-    args = (exp.instance.pk, exp.export_filter, exp.export_type,
-            exp.options)
-
-    batch_tasks = []
-    for task_chunk_id in plan.registry.get(batch_id, []):
-        kwargs = {'chunk_id': task_chunk_id}
-        batch_tasks.append(do_export_chunk.s(cumulative_vals, *args, **kwargs))
-
-    prev_batch_task_id = delegate_batch.request.id
-    if batch_tasks:
-        next_batch_num = batch_num + 1
-        next_batch_id = plan.get_batch_id(next_batch_num)
-        if next_batch_id in plan.registry:
-            # If this isn't the last batch, then the callback for this
-            # batch / chord is a new delegate_batch task, to start the
-            # next batch.
-            cb = delegate_batch.s(*args, chunk_id=next_batch_id,
-                                  batch_num=next_batch_num,
-                                  prev_batch_task_id=prev_batch_task_id,
-                                  cumulative_vals=cumulative_vals)
-
-            # The error callback for that task is another of the same
-            # type. Celery will run that error callback if any chunk in
-            # the (current) chord raises an error. In that case, we
-            # want processing to continue, and we need to pass the
-            # error-related args to work around the error. Or, if there
-            # is an error in the first callback (delegate) task itself,
-            # then this will run, too, which will effectively retry
-            # that task. A second error callback is in place in case it
-            # errors again.
-            err_cb1 = delegate_batch.s(*args, chunk_id=next_batch_id,
-                                       batch_num=next_batch_num,
-                                       prev_batch_had_errors=True,
-                                       prev_batch_task_id=prev_batch_task_id,
-                                       cumulative_vals=cumulative_vals)
+            exp.log('Info', 'Fetching PK lists.')
+            pk_lists = _fetch_job_pk_lists(exp, plan)
+            exp.log('Info', 'Initializing job plan.')
+            plan.generate(pk_lists)
+            if plan.registry:
+                exp.log('Info', _hr_line())
+                plan.log_plan_summary(exp)
+                exp.log('Info', _hr_line())
+            else:
+                msg = ('No records found for {}. Nothing to do!'
+                       ''.format(', '.join(pk_lists.keys())))
+                exp.log('Info', msg)
+
+        elif prev_batch_had_errors:
+            vals_list = _compile_vals_list_for_batch(prev_batch_task_id)
+            exp.log('Info', vals_list)
+
+        cumulative_vals = exp.compile_vals([cumulative_vals] + vals_list)
 
-            # The second error callback is attached to the previous
-            # error callback, and it's only needed in case there is a
-            # fatal error in the delegate_batch task itself. Then
-            # processing can't continue, and it just needs to run
-            # do_final_cleanup to log the current state and exit as
-            # gracefully as possible.
-            err_cb2 = do_final_cleanup.s(*args, status='errors',
-                                         delegate_error=True)
-            err_cb1.link_error(err_cb2)
-            cb.link_error(err_cb1)
+        # UNCOMMENT the below to help troubleshoot issues with `vals`
+        # exp.log('Info', 'BATCH {}'.format(batch_num))
+        # exp.log('Info', 'vals_list: {}'.format(vals_list))
+        # exp.log('Info', 'cumulative_vals: {}'.format(cumulative_vals))
+
+        batch_id = plan.get_batch_id(batch_num)
+        args = (exp.instance.pk, exp.export_filter, exp.export_type,
+                exp.options)
+
+        batch_tasks = []
+        for task_chunk_id in plan.registry.get(batch_id, []):
+            kwargs = {'chunk_id': task_chunk_id}
+            batch_tasks.append(do_export_chunk.s(cumulative_vals, *args,
+                                                 **kwargs))
+
+        prev_batch_task_id = delegate_batch.request.id
+        if batch_tasks:
+            next_batch_num = batch_num + 1
+            next_batch_id = plan.get_batch_id(next_batch_num)
+            if next_batch_id in plan.registry:
+                # If this isn't the last batch, then the callback for this
+                # batch / chord is a new delegate_batch task, to start the
+                # next batch.
+                cb = delegate_batch.s(*args, chunk_id=next_batch_id,
+                                      batch_num=next_batch_num,
+                                      prev_batch_task_id=prev_batch_task_id,
+                                      cumulative_vals=cumulative_vals)
+
+                # The error callback for that task is another of the same
+                # type. Celery will run that error callback if any chunk in
+                # the (current) chord raises an error. In that case, we
+                # want processing to continue, and we need to pass the
+                # error-related args to work around the error. Or, if there
+                # is an error in the first callback (delegate) task itself,
+                # then this will run, too, which will effectively retry
+                # that task. A second error callback is in place in case it
+                # errors again.
+                err_cb1 = delegate_batch.s(
+                    *args, chunk_id=next_batch_id, batch_num=next_batch_num,
+                    prev_batch_had_errors=True,
+                    prev_batch_task_id=prev_batch_task_id,
+                    cumulative_vals=cumulative_vals)
+
+                # The second error callback is attached to the previous
+                # error callback, and it's only needed in case there is a
+                # fatal error in the delegate_batch task itself. Then
+                # processing can't continue, and it just needs to run
+                # do_final_cleanup to log the current state and exit as
+                # gracefully as possible.
+                err_cb2 = do_final_cleanup.s(*args, status='errors',
+                                             delegate_error=True)
+                err_cb1.link_error(err_cb2)
+                cb.link_error(err_cb1)
 
+            else:
+                # If this IS the last batch in the job, then the callback
+                # is do_final_cleanup.
+                cb = do_final_cleanup.s(*args, cumulative_vals=cumulative_vals)
+
+                # And, we add another call to do_final_cleanup as the
+                # link_error for that callback. If any chunk in the current
+                # chord raises an error, this will be called; that way the
+                # job still completes.
+                cb.link_error(
+                    do_final_cleanup.s(*args, status='errors',
+                                       prev_batch_task_id=prev_batch_task_id,
+                                       cumulative_vals=cumulative_vals)
+                )
+            chord(batch_tasks, cb).apply_async()
         else:
-            # If this IS the last batch in the job, then the callback
-            # is do_final_cleanup.
-            cb = do_final_cleanup.s(*args, cumulative_vals=cumulative_vals)
-
-            # And, we add another call to do_final_cleanup as the
-            # link_error for that callback. If any chunk in the current
-            # chord raises an error, this will be called; that way the
-            # job still completes.
-            cb.link_error(
-                do_final_cleanup.s(*args, status='errors',
-                                   prev_batch_task_id=prev_batch_task_id,
-                                   cumulative_vals=cumulative_vals)
-            )
-        chord(batch_tasks, cb).apply_async()
-    else:
-        do_final_cleanup.s(vals_list, *args).apply_async()
+            do_final_cleanup.s(vals_list, *args).apply_async()
+    finally:
+        _flush_log_counters(exp)
 
 
 @shared_task(base=ExportTask)
@@ -567,10 +593,14 @@ def do_export_chunk(cumulative_vals, instance_pk, export_filter, export_type,
     chunk_label = 'records {} - {} for {}'.format(start, end, op)
     exp.log('Info', 'Starting {} ({}).'.format(chunk_id, chunk_label))
 
-    records = plan.get_records_for_operation(exp, op)
-    packed_chunk_pks = plan.get_chunk_pks(chunk_id)
-    chunk_records = _filter_records_by_packed_pks(records, packed_chunk_pks)
-    vals = plan.get_method_for_operation(exp, op)(chunk_records)
+    try:
+        records = plan.get_records_for_operation(exp, op)
+        packed_chunk_pks = plan.get_chunk_pks(chunk_id)
+        chunk_records = _filter_records_by_packed_pks(records,
+                                                      packed_chunk_pks)
+        vals = plan.get_method_for_operation(exp, op)(chunk_records)
+    finally:
+        _flush_log_counters(exp)
 
     exp.log('Info', 'Finished {} ({}).'.format(chunk_id, chunk_label))
     return vals
@@ -589,6 +619,8 @@ def do_final_cleanup(vals_list, instance_pk, export_filter, export_type,
     emailing site admins if there were errors, etc.
     """
     exp = spawn_exporter(instance_pk, export_filter, export_type, options)
+    exp.flush_log_counters()
+    exp.instance.refresh_from_db(fields=['errors', 'warnings'])
     errors = exp.instance.errors
     warnings = exp.instance.warnings
 
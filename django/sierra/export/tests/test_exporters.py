@@ -2,8 +2,12 @@
 Tests classes derived from `export.exporter.Exporter`.
 """
 
+import threading
+
 import pytest
 
+from export.models import ExportInstance
+
 # FIXTURES AND TEST DATA
 # Fixtures used in the below tests can be found in
 # django/sierra/base/tests/conftest.py:
@@ -431,6 +435,79 @@ def test_max_chunk_settings_defaults(et_code, settings, basic_exporter_class,
     assert exporter.max_del_chunk == expclass.max_del_chunk
 
 
+@pytest.mark.parametrize('method', ['flush_log_counters', 'save_status'])
+def test_exporter_log_counts_saved_to_instance(method, new_exporter,
+                                               derive_child_exporter_class):
+    """
+    Warnings and errors logged via an exporter's `log` method should be
+    added to the ExportInstance in the database when the exporter's
+    `flush_log_counters` or `save_status` method runs. Info messages
+    should not be counted.
+    """
+    expclass = derive_child_exporter_class()
+    exp = new_exporter(expclass, 'full_export', 'waiting')
+    exp.status = 'success'
+    exp.log('Warning', 'Warning 1')
+    exp.log('Warning', 'Warning 2')
+    exp.log('Error', 'Error 1')
+    exp.log('Info', 'Info 1')
+    instance = ExportInstance.objects.get(pk=exp.instance.pk)
+    assert (instance.warnings, instance.errors) == (0, 0)
+
+    getattr(exp, method)()
+    instance = ExportInstance.objects.get(pk=exp.instance.pk)
+    assert (instance.warnings, instance.errors) == (2, 1)
+
+    # Counts are reset after flushing, so nothing is added twice.
+    exp.flush_log_counters()
+    instance = ExportInstance.objects.get(pk=exp.instance.pk)
+    assert (instance.warnings, instance.errors) == (2, 1)
+
+
+def test_exporter_save_status_unknown_status(new_exporter,
+                                             derive_child_exporter_class):
+    """
+    If an exporter's `status` isn't defined in the database,
+    `save_status` should save the status as 'unknown' and log a
+    Warning, which is counted on the ExportInstance.
+    """
+    expclass = derive_child_exporter_class()
+    exp = new_exporter(expclass, 'full_export', 'waiting')
+    exp.status = 'not_a_real_status'
+    exp.save_status()
+    instance = ExportInstance.objects.get(pk=exp.instance.pk)
+    assert instance.status_id == 'unknown'
+    assert exp.instance.status_id == 'unknown'
+    assert instance.warnings == 1
+
+
+@pytest.mark.compound
+@pytest.mark.parametrize('classname', ['AttachedRecordExporter',
+                                       'BatchExporter'])
+@pytest.mark.parametrize('method', ['flush_log_counters', 'save_status'])
+def test_compound_exporter_log_counts_saved_to_instance(
+        classname, method, derive_compound_exporter_class,
+        derive_child_exporter_class, new_exporter):
+    """
+    For compound exporters, `flush_log_counters` and `save_status` on
+    the parent should also save warnings and errors logged by any
+    children, which share the parent's ExportInstance.
+    """
+    child_classes = [derive_child_exporter_class(newname=n)
+                     for n in ('C1', 'C2')]
+    expclass = derive_compound_exporter_class(classname, 'export.exporter',
+                                              children=child_classes)
+    exp = new_exporter(expclass, 'full_export', 'waiting')
+    exp.status = 'success'
+    exp.log('Warning', 'Parent warning')
+    exp.children['C1'].log('Warning', 'C1 warning')
+    exp.children['C2'].log('Error', 'C2 error')
+
+    getattr(exp, method)()
+    instance = ExportInstance.objects.get(pk=exp.instance.pk)
+    assert (instance.warnings, instance.errors) == (2, 1)
+
+
 @pytest.mark.return_vals
 @pytest.mark.parametrize('vals_list, expected', [
     ([ { 'ids': ['b1', 'b2'] },
@@ -770,6 +847,86 @@ def test_compound_final_callback(classname, children, vals,
                                                 status='success')
 
 
+@pytest.mark.compound
+@pytest.mark.do_export
+@pytest.mark.parametrize('method', ['export_records', 'delete_records'])
+def test_compound_ops_parallel_children(method, derive_compound_exporter_class,
+                                        derive_child_exporter_class,
+                                        new_exporter, mocker):
+    """
+    When `parallel_children` is True, running an operation on a
+    BatchExporter should run each child's operation in a pool thread,
+    still pass each child its own recordset, and return a dict
+    containing each child's return vals.
+    """
+    threads_used = {}
+
+    def make_op(name):
+        def _op(records):
+            threads_used[name] = threading.current_thread()
+            return {'name': name}
+        return _op
+
+    child_classes = []
+    for name in ('C1', 'C2'):
+        child = derive_child_exporter_class(newname=name)
+        mocker.patch.object(child, method)
+        getattr(child, method).side_effect = make_op(name)
+        child_classes.append(child)
+
+    expclass = derive_compound_exporter_class(
+        'BatchExporter', 'export.exporter',
+        p_attrs={'parallel_children': True}, children=child_classes)
+    exp = new_exporter(expclass, 'full_export', 'waiting')
+    return_vals = getattr(exp, method)({'C1': ['a'], 'C2': ['b']})
+    assert return_vals == {'C1': {'name': 'C1'}, 'C2': {'name': 'C2'}}
+    getattr(exp.children['C1'], method).assert_called_with(['a'])
+    getattr(exp.children['C2'], method).assert_called_with(['b'])
+    main_thread = threading.current_thread()
+    assert set(threads_used.keys()) == set(['C1', 'C2'])
+    assert all(t is not main_thread for t in threads_used.values())
+
+
+@pytest.mark.compound
+@pytest.mark.parametrize('att_attrs, expected_pr', [
+    ({'select_related': ['att_sr'], 'prefetch_related': ['att_pr']},
+     ['att__att_pr', 'att__att_sr', 'main_pr']),
+    ({}, ['att', 'main_pr']),
+], ids=[
+    'attached child has relations: only prefixed relations are added',
+    'attached child has no relations: bare rel_prefix is added',
+])
+def test_attached_exporter_related_lists(att_attrs, expected_pr,
+                                         derive_compound_exporter_class,
+                                         derive_child_exporter_class,
+                                         new_exporter):
+    """
+    For AttachedRecordExporter, `select_related` should come from the
+    main child, and `prefetch_related` should combine the
+    `prefetch_related` lists from all children and the `select_related`
+    lists from attached children. Relations for attached children
+    should be prefixed; an attached child's bare `rel_prefix` should
+    only be added if it has no relations of its own. These are derived
+    from the child classes, so no children get spawned.
+    """
+    main = derive_child_exporter_class(newname='C1', c_attrs={
+        'select_related': ['main_sr'], 'prefetch_related': ['main_pr']
+    })
+    attached = derive_child_exporter_class(newname='C2', c_attrs=att_attrs)
+    expclass = derive_compound_exporter_class('AttachedRecordExporter',
+                                              'export.exporter',
+                                              children=[main, attached])
+
+    class PrefixedChild(expclass.Child):
+        rel_prefix = 'att'
+
+    expclass.children_config = (expclass.Child('C1'), PrefixedChild('C2'))
+    exp = new_exporter(expclass, 'full_export', 'waiting')
+    assert exp.select_related == ['main_sr']
+    assert exp.prefetch_related == expected_pr
+    assert exp._children is None
+
+
 @pytest.mark.return_vals
 def test_ertosolr_export_returns_h_lists(basic_exporter_class, record_sets,
                                          new_exporter):
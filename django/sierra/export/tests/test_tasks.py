@@ -0,0 +1,110 @@
+"""
+Tests tasks in `export.tasks`.
+"""
+
+import pytest
+
+from export import tasks
+from export.models import ExportInstance
+
+# FIXTURES AND TEST DATA
+# Fixtures used in the below tests can be found in
+# django/sierra/conftest.py:
+#    new_exporter, derive_child_exporter_class
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def task_exporter(derive_child_exporter_class, new_exporter, mocker):
+    """
+    Pytest fixture that returns an exporter that the tasks in
+    `export.tasks` will use in place of one they spawn themselves. The
+    Redis-backed JobPlan is mocked, and `needs_database` is kept from
+    closing the test DB connection.
+    """
+    exp = new_exporter(derive_child_exporter_class(), 'full_export',
+                       'waiting')
+    mocker.patch('export.tasks.spawn_exporter', return_value=exp)
+    mocker.patch('export.tasks.connections')
+    plan = mocker.patch('export.tasks.JobPlan').return_value
+    plan.get_chunk_record_range.return_value = (1, 10, 'export')
+    return exp
+
+
+def counts_in_db(exp):
+    instance = ExportInstance.objects.get(pk=exp.instance.pk)
+    return (instance.warnings, instance.errors)
+
+
+def task_args(exp):
+    return (exp.instance.pk, exp.export_filter, exp.export_type, exp.options)
+
+
+@pytest.mark.parametrize('raises', [False, True])
+def test_do_export_chunk_saves_log_counts(raises, task_exporter, mocker):
+    """
+    The `do_export_chunk` task should save warning/error counts logged
+    while loading the chunk, whether or not the chunk fails.
+    """
+    exp = task_exporter
+
+    def _export_records(records):
+        exp.log('Warning', 'Warning 1')
+        exp.log('Error', 'Error 1')
+        if raises:
+            raise ValueError('Chunk failed')
+        return {}
+
+    plan = tasks.JobPlan.return_value
+    plan.get_method_for_operation.return_value = _export_records
+    mocker.patch('export.tasks._filter_records_by_packed_pks')
+    if raises:
+        with pytest.raises(ValueError):
+            tasks.do_export_chunk(None, *task_args(exp), chunk_id='c1')
+    else:
+        tasks.do_export_chunk(None, *task_args(exp), chunk_id='c1')
+    assert counts_in_db(exp) == (1, 1)
+
+
+def test_delegate_batch_saves_log_counts(task_exporter, mocker):
+    """
+    The `delegate_batch` task should save warning/error counts logged
+    while planning the job, even if planning fails.
+    """
+    exp = task_exporter
+
+    def _fetch_job_pk_lists(exp, plan):
+        exp.log('Warning', 'Warning 1')
+        raise ValueError('Planning failed')
+
+    mocker.patch('export.tasks._fetch_job_pk_lists',
+                 side_effect=_fetch_job_pk_lists)
+    with pytest.raises(ValueError):
+        tasks.delegate_batch([], *task_args(exp), chunk_id='header')
+    assert counts_in_db(exp) == (1, 0)
+
+
+def test_exporttask_on_success_saves_log_counts(task_exporter):
+    """
+    The ExportTask `on_success` handler should save warning/error
+    counts logged by the exporter it spawns.
+    """
+    exp = task_exporter
+    plan = tasks.JobPlan.return_value
+    plan.finish_chunk.side_effect = lambda chunk_id: exp.log('Warning', 'W')
+    args = (None,) + task_args(exp)
+    tasks.do_export_chunk.on_success({}, 'task-1', args, {'chunk_id': 'c1'})
+    assert counts_in_db(exp) == (1, 0)
+
+
+def test_exporttask_on_failure_saves_log_counts(task_exporter):
+    """
+    The ExportTask `on_failure` handler should log the failure as an
+    Error on the exporter and save it to the ExportInstance.
+    """
+    exp = task_exporter
+    args = (None,) + task_args(exp)
+    tasks.do_export_chunk.on_failure(ValueError('Chunk failed'), 'task-1',
+                                     args, {'chunk_id': 'c1'}, None)
+    assert counts_in_db(exp) == (0, 1)
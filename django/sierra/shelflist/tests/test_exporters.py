@@ -31,33 +31,28 @@ def exporter_class(derive_exporter_class):
 
 # TESTS
 
-def test_main_itemstosolr_version(new_exporter, exporter_class):
-    """
-    Make sure that the main ItemsToSolr job we're testing is from the
-    shelflist app, not the export app.
-    """
-    expclass = exporter_class('ItemsToSolr')
-    exporter = new_exporter(expclass, 'full_export', 'waiting')
-    assert exporter.app_name == 'shelflist'
-
-
-@pytest.mark.parametrize('et_code', [
-    'ItemsBibsToSolr',
-    'BibsAndAttachedToSolr'
+@pytest.mark.parametrize('et_code, app_name, items_app_name', [
+    ('ItemsToSolr', 'shelflist', None),
+    ('ItemsBibsToSolr', 'export', 'shelflist'),
+    ('BibsAndAttachedToSolr', 'export', 'shelflist'),
 ])
-def test_child_itemstosolr_versions(et_code, new_exporter, exporter_class):
+def test_itemstosolr_versions(et_code, app_name, items_app_name,
+                              new_exporter, exporter_class):
     """
-    Compound exporters from the main `export` app should use the
-    ItemsToSolr from the `shelflist` app.
+    Make sure that the main ItemsToSolr job we're testing is from the
+    shelflist app, not the export app, and that compound exporters from
+    the main `export` app use the ItemsToSolr from the `shelflist` app
+    as a child.
     """
     expclass = exporter_class(et_code)
     exporter = new_exporter(expclass, 'full_export', 'waiting')
-    assert exporter.app_name == 'export'
-    for child_etcode, child in exporter.children.items():
-        if child_etcode == 'ItemsToSolr':
-            assert child.app_name == 'shelflist'
-        else:
-            assert child.app_name == 'export'
+    assert exporter.app_name == app_name
+    if items_app_name is not None:
+        for child_etcode, child in exporter.children.items():
+            if child_etcode == 'ItemsToSolr':
+                assert child.app_name == items_app_name
+            else:
+                assert child.app_name == 'export'
 
 
 @pytest.mark.exports
@@ -91,7 +86,8 @@ def test_itemstosolr_get_deletions(exporter_class, record_sets, new_exporter):
     expclass = exporter_class('ItemsToSolr')
     exporter = new_exporter(expclass, 'full_export', 'waiting')
     records = exporter.get_deletions()
-    assert set(records) == set(record_sets['item_del_set'])
+    expected_pks = record_sets['item_del_set'].values_list('pk', flat=True)
+    assert set(records.values_list('pk', flat=True)) == set(expected_pks)
 
 
 @pytest.mark.exports
@@ -165,7 +161,7 @@ def test_itemstosolr_exps_keep_user_fields(exporter_class, new_exporter,
 
     # Reality check to make sure that there's at least one user-field
     # populated in the results. If not, something went wrong.
-    assert any([r.get(ufields[0], False) for r in post_results.values()])
+    assert any(r.get(ufields[0], False) for r in post_results.values())
 
     for record in records:
         pre_result = pre_results[record.pk]